@@ -0,0 +1,83 @@
+"""Cost of finding Bilibili links in chat messages that mostly have none.
+
+Usage: ``python -m benchmarks.parse_prefilter [messages]`` from the repository
+root. The corpus is mostly short chat with CQ codes and a few percent of links;
+``three regexes`` is the matcher the parse plugin used to register.
+"""
+
+import random
+import re
+import sys
+from timeit import repeat
+
+from src.links import PATTERN, find_links
+
+WORDS = (
+    "今天 天气 不错 哈哈哈 草 这个 up主 好强 有没有人 打游戏 晚上 开黑 吗 "
+    "笑死 我了 确实 什么鬼 来了 看看 这个视频 好耶 awsl yyds 666 ok lol nice "
+    "下班 摸鱼 老板 加班 周末 出去玩 吃饭 了吗 绷不住了 典 急了 蚌埠住了"
+).split()
+SEGMENTS = (
+    "[CQ:face,id=178]",
+    "[CQ:image,file=3f2a9c0e.image,subType=0,url=https://gchat.qpic.cn/gchatpic_new/0/0-0-3F2A9C0E/0]",
+    "[CQ:reply,id=-2147483648]",
+    "[CQ:at,qq=10001]",
+)
+LINKS = (
+    " BV17x411w7KC",
+    " av170001",
+    " UID:2",
+    " https://b23.tv/abc1234",
+    '[CQ:json,data={"meta":{"detail_1":{"qqdocurl":"https:\\/\\/b23.tv\\/abc1234"}}}]',
+)
+
+
+def generate(n: int, link_rate: float = 0.02, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        parts = rng.choices(WORDS, k=rng.randint(1, 15))
+        if rng.random() < 0.2:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(SEGMENTS))
+        if rng.random() < link_rate:
+            parts.append(rng.choice(LINKS))
+        corpus.append("".join(parts))
+    return corpus
+
+
+OLD = (
+    re.compile(r"(?:av|AV)(\d{1,16})"),
+    re.compile(r"BV1[1-9a-km-zA-HJ-NP-Z]{9}"),
+    re.compile(r"UID:(\d+)"),
+)
+
+
+def old(corpus: list[str]) -> None:
+    for text in corpus:
+        for pattern in OLD:
+            pattern.search(text)
+
+
+def alternation(corpus: list[str]) -> None:
+    for text in corpus:
+        list(PATTERN.finditer(text))
+
+
+def prefilter(corpus: list[str]) -> None:
+    for text in corpus:
+        find_links(text)
+
+
+def main() -> None:
+    corpus = generate(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+    for name, func in (
+        ("three regexes", old),
+        ("alternation", alternation),
+        ("find_links", prefilter),
+    ):
+        elapsed = min(repeat(lambda: func(corpus), number=1, repeat=5))
+        print(f"{name:>24}: {elapsed / len(corpus) * 1e9:6.0f} ns/message")
+
+
+if __name__ == "__main__":
+    main()
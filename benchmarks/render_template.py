@@ -0,0 +1,96 @@
+"""Render time of the dynamic draw template through htmlkit.
+
+Usage: ``python -m benchmarks.render_template [renders]`` from the repository
+root. ``template_to_pic`` reads and compiles ``draw.html.j2`` on every call;
+``precompiled`` renders the template the way the dynamic plugin does, through
+``load_templates`` and ``html_to_pic``. Image and CSS fetches are stubbed out.
+"""
+
+import sys
+from asyncio import run
+from pathlib import Path
+from time import perf_counter
+
+import nonebot
+
+nonebot.init()
+
+from nonebot_plugin_htmlkit import (
+    html_to_pic,
+    init_fontconfig,
+    none_fetcher,
+    template_to_pic,
+)
+
+from src.templates import load_templates
+
+TEMPLATES = Path(__file__).parents[1] / "src/plugins/bilibili/plugins/dynamic/templates"
+DYNAMIC = {
+    "id_str": "1",
+    "type": "DYNAMIC_TYPE_DRAW",
+    "modules": {
+        "module_author": {
+            "mid": 1,
+            "name": "name",
+            "pub_action": "",
+            "face": "https://i0.hdslb.com/bfs/face/member/noface.jpg",
+            "pub_time": "just now",
+            "vip": {"nickname_color": "#fb7299"},
+        },
+        "module_dynamic": {
+            "additional": None,
+            "major": {
+                "opus": {
+                    "pics": [],
+                    "style": 0,
+                    "title": "title",
+                    "summary": {
+                        "rich_text_nodes": [
+                            {
+                                "type": "RICH_TEXT_NODE_TYPE_TEXT",
+                                "text": "hello 世界 " * 20,
+                            }
+                        ]
+                    },
+                }
+            },
+        },
+    },
+}
+OPTIONS = {
+    "max_width": 360 * 3,
+    "device_height": 640 * 3,
+    "img_fetch_fn": none_fetcher,
+    "allow_refit": False,
+    "image_format": "jpeg",
+    "jpeg_quality": 80,
+}
+
+env, _ = load_templates(TEMPLATES)
+draw_template = env.get_template("draw.html.j2")
+
+
+async def before() -> bytes:
+    return await template_to_pic(
+        str(TEMPLATES), "draw.html.j2", DYNAMIC, css_fetch_fn=none_fetcher, **OPTIONS
+    )
+
+
+async def after() -> bytes:
+    return await html_to_pic(await draw_template.render_async(DYNAMIC), **OPTIONS)
+
+
+async def main() -> None:
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    init_fontconfig()
+    for name, func in (("template_to_pic", before), ("precompiled", after)):
+        await func()
+        start = perf_counter()
+        for _ in range(renders):
+            await func()
+        elapsed = perf_counter() - start
+        print(f"{name:>16}: {elapsed / renders * 1e3:6.1f} ms/render")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,47 @@
+"""Per-id cost of the dynamic seen window as it grows.
+
+Run with ``python -m benchmarks.seen_window [pages]`` from the repository root.
+Each size is prefilled with that many ids, then fed pages of ``PAGE`` ids of
+which ``NEW`` are newer than anything seen.
+"""
+
+import sys
+from timeit import repeat
+
+from src.cache import Cache
+
+PAGE = 12
+NEW = 2
+SIZES = (100, 10_000, 100_000)
+BASE = 900_000_000_000_000_000
+
+
+def generate(size: int, pages: int) -> list[list[int]]:
+    feed = []
+    top = BASE + size
+    for _ in range(pages):
+        page = list(range(top + NEW - 1, top - 1, -1))
+        page += range(top - 1, top - 1 - (PAGE - NEW), -1)
+        feed.append(page)
+        top += NEW
+    return feed
+
+
+def feed(size: int, pages: list[list[int]]) -> None:
+    cache = Cache(size)
+    cache.replace_many(range(BASE, BASE + size))
+    for page in pages:
+        cache.replace_many(page)
+
+
+def main() -> None:
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    for size in SIZES:
+        data = generate(size, pages)
+        prefill = min(repeat(lambda: feed(size, []), number=1, repeat=3))
+        elapsed = min(repeat(lambda: feed(size, data), number=1, repeat=3))
+        print(f"{size:>7} ids: {(elapsed - prefill) / (pages * PAGE) * 1e9:6.0f} ns/id")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+from asyncio import Future, ensure_future, shield
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from contextlib import suppress
+from hashlib import sha256
+from heapq import heappush, heappushpop
+from pathlib import Path
+from time import time
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LRUCache:
+    maxsize: int
+    ttl: float | None
+    path: Path | None
+    disk_maxsize: int
+    data: OrderedDict[str, tuple[float, bytes]]
+    disk: OrderedDict[str, int]
+    size: int
+    disk_size: int
+    hits: int
+    misses: int
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float | None = None,
+        path: Path | None = None,
+        disk_maxsize: int = 0,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.data = OrderedDict()
+        self.disk = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            path.mkdir(parents=True, exist_ok=True)
+            for file in sorted(path.iterdir(), key=lambda file: file.stat().st_mtime):
+                self.disk[file.name] = file.stat().st_size
+                self.disk_size += self.disk[file.name]
+            self.evict_disk()
+
+    def __repr__(self) -> str:
+        return (
+            f"LRUCache(size={self.size}, disk_size={self.disk_size}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+    def is_expired(self, timestamp: float) -> bool:
+        return self.ttl is not None and time() - timestamp > self.ttl
+
+    def get(self, key: str) -> bytes | None:
+        if (value := self.get_memory(key)) is None:
+            value = self.get_disk(key)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_memory(self, key: str) -> bytes | None:
+        if (item := self.data.get(key)) is None:
+            return None
+
+        timestamp, value = item
+        if self.is_expired(timestamp):
+            self.pop(key)
+            return None
+
+        self.data.move_to_end(key)
+        return value
+
+    def get_disk(self, key: str) -> bytes | None:
+        if not self.path or (name := self.digest(key)) not in self.disk:
+            return None
+
+        file = self.path / name
+        try:
+            if self.is_expired(timestamp := file.stat().st_mtime):
+                raise FileNotFoundError
+            value = file.read_bytes()
+        except OSError:
+            self.disk_size -= self.disk.pop(name)
+            file.unlink(missing_ok=True)
+            return None
+
+        self.disk.move_to_end(name)
+        self.set_memory(key, value, timestamp)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.pop(key)
+        self.set_memory(key, value, time())
+
+        if not self.path:
+            return
+
+        name = self.digest(key)
+        with suppress(OSError):
+            (self.path / name).write_bytes(value)
+            self.disk_size -= self.disk.pop(name, 0)
+            self.disk[name] = len(value)
+            self.disk_size += len(value)
+            self.evict_disk()
+
+    def set_memory(self, key: str, value: bytes, timestamp: float) -> None:
+        if len(value) > self.maxsize:
+            return
+
+        self.data[key] = timestamp, value
+        self.size += len(value)
+
+        while self.size > self.maxsize:
+            self.size -= len(self.data.popitem(last=False)[1][1])
+
+    def pop(self, key: str) -> None:
+        if (item := self.data.pop(key, None)) is not None:
+            self.size -= len(item[1])
+
+    def evict_disk(self) -> None:
+        assert self.path
+
+        while self.disk_size > self.disk_maxsize:
+            name, size = self.disk.popitem(last=False)
+            self.disk_size -= size
+            (self.path / name).unlink(missing_ok=True)
+
+    @staticmethod
+    def digest(key: str) -> str:
+        return sha256(key.encode()).hexdigest()
+
+
+class SingleFlight(Generic[T]):
+    futures: dict[str, Future[T]]
+    calls: int
+    merged: int
+
+    def __init__(self) -> None:
+        self.futures = {}
+        self.calls = 0
+        self.merged = 0
+
+    def __repr__(self) -> str:
+        return f"SingleFlight(calls={self.calls}, merged={self.merged})"
+
+    async def __call__(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        if (future := self.futures.get(key)) is None:
+            self.calls += 1
+            future = self.futures[key] = ensure_future(func())
+            future.add_done_callback(lambda _: self.futures.pop(key, None))
+        else:
+            self.merged += 1
+
+        return await shield(future)
+
+
+class Cache:
+    capacity: int
+    data: set[int]
+    heap: list[int]
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.data = set()
+        self.heap = []
+
+    def __contains__(self, item: int) -> bool:
+        return item in self.data
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, item: int) -> bool:
+        if item in self.data:
+            return False
+
+        if len(self.heap) < self.capacity:
+            heappush(self.heap, item)
+        elif item > self.heap[0]:
+            self.data.remove(heappushpop(self.heap, item))
+        else:
+            return False
+
+        self.data.add(item)
+        return True
+
+    def replace(self, item: int) -> bool:
+        return not (self.heap and item < self.heap[0]) and self.push(item)
+
+    def replace_many(self, items: Iterable[int]) -> list[int]:
+        return [item for item in items if self.replace(item)]
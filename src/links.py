@@ -0,0 +1,22 @@
+import re
+
+PATTERN = re.compile(
+    r"(?:av|AV)(?P<aid>\d{1,16})"
+    r"|(?P<bvid>BV1[1-9a-km-zA-HJ-NP-Z]{9})"
+    r"|(?:UID:|space\.bilibili\.com\\?/)(?P<uid>\d+)"
+    r"|b23\.tv\\?/(?P<short>[0-9A-Za-z]+)"
+)
+
+
+def find_links(text: str) -> list[re.Match[str]]:
+    if not (
+        "av" in text
+        or "AV" in text
+        or "BV1" in text
+        or "UID:" in text
+        or "b23.tv" in text
+        or "space.bilibili.com" in text
+    ):
+        return []
+
+    return list(PATTERN.finditer(text))
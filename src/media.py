@@ -0,0 +1,166 @@
+import re
+from asyncio import gather
+from collections.abc import Iterable
+from contextlib import suppress
+from dataclasses import replace
+from hashlib import sha256
+from mimetypes import guess_type
+from pathlib import Path
+from time import time
+
+from nonebot import get_driver, get_plugin_config, logger, require
+from nonebot.drivers import URL, ASGIMixin, HTTPServerSetup, Request, Response
+from nonebot_plugin_alconna import Image, UniMessage
+from nonebot_plugin_alconna.uniseg import Receipt
+from nonebot_plugin_uninfo.orm import SceneModel
+from pydantic import BaseConfig, BaseModel, Extra
+
+from .utils import Priority, send_message, targets, with_prefix
+
+require("nonebot_plugin_apscheduler")
+require("nonebot_plugin_localstore")
+
+import nonebot_plugin_localstore as store
+from nonebot_plugin_apscheduler import scheduler
+
+
+class Config(BaseModel):
+    dir: Path = store.get_cache_dir(None) / "media"
+    adapters: set[str] = set()
+    base_url: str | None = None
+    ttl: int = 86400
+
+    class Config(BaseConfig):
+        alias_generator = with_prefix("media")
+        extra = Extra.ignore
+
+
+driver = get_driver()
+config = get_plugin_config(Config)
+
+
+NAME_PATTERN = re.compile(r"[0-9a-f]{64}(\.\w+)?")
+
+
+class MediaStore:
+    path: Path
+    ttl: float
+    base_url: str | None
+    hits: int
+    misses: int
+    served: int
+
+    def __init__(self, path: Path, ttl: float, base_url: str | None = None) -> None:
+        self.path = path.resolve()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.base_url = base_url and base_url.rstrip("/")
+        self.hits = 0
+        self.misses = 0
+        self.served = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"MediaStore(hits={self.hits}, misses={self.misses}, "
+            f"served={self.served})"
+        )
+
+    def put(self, data: bytes, suffix: str = "") -> Path:
+        file = self.path / f"{sha256(data).hexdigest()}{suffix}"
+        if file.exists():
+            self.hits += 1
+            file.touch()
+            return file
+
+        self.misses += 1
+        tmp = file.with_name(f"{file.name}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(file)
+        return file
+
+    def get(self, name: str) -> Path | None:
+        if not NAME_PATTERN.fullmatch(name):
+            return None
+
+        file = self.path / name
+        try:
+            if time() - file.stat().st_mtime > self.ttl:
+                return None
+        except OSError:
+            return None
+
+        return file
+
+    def prune(self) -> None:
+        pruned = 0
+        for file in self.path.iterdir():
+            with suppress(OSError):
+                if time() - file.stat().st_mtime > self.ttl:
+                    file.unlink()
+                    pruned += 1
+
+        logger.debug(f"Pruned {pruned} expired media: {self}")
+
+    def localize(self, msg: UniMessage) -> UniMessage:
+        segs = []
+        for seg in msg:
+            if isinstance(seg, Image) and seg.raw:
+                raw = seg.raw_bytes
+                file = self.put(raw, Path(seg.name).suffix)
+                seg = (
+                    replace(seg, raw=None, url=f"{self.base_url}/media/{file.name}")
+                    if self.base_url
+                    else replace(seg, raw=None, path=file)
+                )
+            segs.append(seg)
+
+        return UniMessage(segs)
+
+
+media = MediaStore(config.dir, config.ttl, config.base_url)
+
+
+async def serve(request: Request) -> Response:
+    if (file := media.get(request.url.path.rpartition("/")[2])) is None:
+        return Response(404)
+
+    media.served += 1
+    return Response(
+        200,
+        headers={
+            "Content-Type": guess_type(file.name)[0] or "application/octet-stream",
+            "Cache-Control": f"public, max-age={int(media.ttl)}, immutable",
+        },
+        content=file.read_bytes(),
+    )
+
+
+if isinstance(driver, ASGIMixin):
+    driver.setup_http_server(
+        HTTPServerSetup(URL("/media/{name}"), "GET", "media", serve)
+    )
+
+
+scheduler.add_job(media.prune, "interval", hours=1)
+
+
+async def send_messages(
+    scene_models: Iterable[SceneModel],
+    msg: UniMessage,
+    priority: int = Priority.NORMAL,
+) -> list[Receipt]:
+    local: UniMessage | None = None
+
+    async def send(scene_model: SceneModel) -> Receipt:
+        nonlocal local
+
+        bot_model, _ = await targets.get(scene_model)
+        if bot_model.adapter not in config.adapters:
+            return await send_message(scene_model, msg, priority)
+
+        if local is None:
+            local = media.localize(msg)
+            logger.debug(f"Localized message media: {media}")
+        return await send_message(scene_model, local, priority)
+
+    return await gather(*(send(scene_model) for scene_model in scene_models))
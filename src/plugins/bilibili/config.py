@@ -1,10 +1,28 @@
-from pydantic import BaseConfig, BaseModel, Extra
+from pydantic import BaseConfig, BaseModel, Extra, validator
 
 from ...utils import with_prefix
 
 
 class Config(BaseModel):
     cookies: dict[str, str]
+    share_cache_size: int = 1 << 20
+    share_cache_ttl: int = 86400
+    placard_cache_size: int = 1 << 20
+    placard_cache_ttl: int = 3600
+    rate_limits: dict[str, float] = {
+        "feed": 1,
+        "relation": 0.5,
+        "share": 2,
+        "live": 5,
+    }
+    rate_burst: int = 5
+    backoff_min: float = 60
+    backoff_max: float = 1800
+
+    @validator("rate_limits")
+    @classmethod
+    def merge_rate_limits(cls, v: dict[str, float]) -> dict[str, float]:
+        return cls.__fields__["rate_limits"].default | v
 
     class Config(BaseConfig):
         alias_generator = with_prefix("bilibili")
@@ -1,31 +1,50 @@
-from asyncio import gather
-from contextlib import asynccontextmanager
-from importlib.resources import as_file, files
-from queue import PriorityQueue
+import re
+from asyncio import Lock, Task, gather, timeout, wait
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import asynccontextmanager, suppress
+from functools import partial
+from hashlib import sha256
+from importlib.resources import files
+from json import dumps, loads
+from time import perf_counter, time
 from typing import Annotated, Any, AsyncGenerator
+from urllib.parse import urlsplit
 
 import backoff
 from arclet.alconna import Arg
-from httpx import AsyncClient
-from nonebot import get_driver, get_plugin_config
+from nonebot import get_driver, get_plugin_config, logger, require
 from nonebot.permission import SUPERUSER
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_alconna import Alconna, Image, Subcommand, UniMessage, on_alconna
 from nonebot_plugin_apscheduler import scheduler
-from nonebot_plugin_htmlkit import template_to_pic
+from nonebot_plugin_htmlkit import html_to_pic
 from nonebot_plugin_htmlrender.browser import get_browser
 from nonebot_plugin_orm import async_scoped_session, get_session
 from nonebot_plugin_uninfo import MEMBER
 from nonebot_plugin_uninfo.orm import SceneModel, SceneOrm
-from playwright.async_api import BrowserContext, Page
-from sqlalchemy import exists, select
+from playwright.async_api import BrowserContext, Error, Page, Request, Route
+from sqlalchemy import delete, exists, select
 
-from .....utils import run_task, send_message
+from .....cache import Cache, LRUCache, SingleFlight
+from .....media import send_messages
+from .....templates import load_templates
+from .....utils import USER_AGENT, Stage, get_client, run_task
 from ... import plugin_config as bilibili_config
-from ...utils import UID_ARG, get_share_click, handle_error, raise_for_status
+from ...utils import (
+    UID_ARG,
+    SubscriptionIndex,
+    get_share_click,
+    handle_error,
+    limiters,
+    raise_for_status,
+)
 from . import templates
 from .config import Config
-from .models import Dynamic, Dynamics, Subscription
+from .models import Dynamic, Dynamics, Seen, Subscription
+
+require("nonebot_plugin_localstore")
+
+import nonebot_plugin_localstore as store
 
 __plugin_meta__ = PluginMetadata(
     name="bilibili.dynamic",
@@ -38,110 +57,257 @@ driver = get_driver()
 global_config = get_driver().config
 plugin_config = get_plugin_config(Config)
 
-client = AsyncClient(
-    headers={
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
-    },
+client = get_client(
+    "bilibili.dynamic",
+    headers={"user-agent": USER_AGENT},
     cookies=bilibili_config.cookies,
     base_url="https://api.bilibili.com/x",
 )
 
 
+img_cache = LRUCache(
+    plugin_config.img_cache_size,
+    plugin_config.img_cache_ttl,
+    store.get_plugin_cache_dir() / "img",
+    plugin_config.img_cache_disk_size,
+)
+img_flight = SingleFlight[bytes]()
+
+
+async def fetch_img(url: str) -> bytes:
+    resp = await client.get(url + "@.avif")
+    if resp.is_success:
+        img_cache.set(url, resp.content)
+    return resp.content
+
+
 async def img_fetch_fn(url: str) -> bytes:
-    return (await client.get(url + "@.avif")).content
-
-
-class Cache:
-    data: set[str]
-    queue: PriorityQueue[str]
-
-    def __init__(self) -> None:
-        self.data = set()
-        self.queue = PriorityQueue()
-
-    def push(self, item: str) -> None:
-        if item in self.data:
-            return
-        self.queue.put_nowait(item)
-        self.data.add(item)
-
-    def pop(self) -> str:
-        item = self.queue.get_nowait()
-        self.data.remove(item)
-        return item
-
-    def replace(self, item: str) -> str | None:
-        if item < self.queue.queue[0] or item in self.data:
-            return
-        self.push(item)
-        return self.pop()
-
-
-cache = Cache()
-
-
-async def get_dynamics(page: int = 1) -> Dynamics:
-    return raise_for_status(
-        await client.get(
-            "/polymer/web-dynamic/v1/feed/all",
-            params={
-                "type": "all",
-                "page": page,
-                "features": ",".join(
-                    (
-                        "itemOpusStyle",
-                        "listOnlyfans",
-                        "opusBigCover",
-                        "onlyfansVote",
-                        "decorationCard",
-                        "onlyfansAssetsV2",
-                        "forwardListHidden",
-                        "ugcDelete",
-                        "onlyfansQaCard",
-                        "commentsNewVersion",
-                        "avatarAutoTheme",
-                    )
-                ),
-            },
+    if (content := img_cache.get(url)) is None:
+        content = await img_flight(url, partial(fetch_img, url))
+    return content
+
+
+cache = Cache(plugin_config.cache_size)
+_baseline: str = ""
+
+
+async def get_dynamics(offset: str = "") -> Dynamics:
+    async with limiters["feed"]:
+        return raise_for_status(
+            await client.get(
+                "/polymer/web-dynamic/v1/feed/all",
+                params={
+                    "type": "all",
+                    "offset": offset,
+                    "features": ",".join(
+                        (
+                            "itemOpusStyle",
+                            "listOnlyfans",
+                            "opusBigCover",
+                            "onlyfansVote",
+                            "decorationCard",
+                            "onlyfansAssetsV2",
+                            "forwardListHidden",
+                            "ugcDelete",
+                            "onlyfansQaCard",
+                            "commentsNewVersion",
+                            "avatarAutoTheme",
+                        )
+                    ),
+                },
+            )
         )
-    )
+
+
+async def get_update_num(update_baseline: str) -> int:
+    async with limiters["feed"]:
+        return raise_for_status(
+            await client.get(
+                "/polymer/web-dynamic/v1/feed/all/update",
+                params={"type": "all", "update_baseline": update_baseline},
+            )
+        )["update_num"]
 
 
 async def get_relation(uid: int) -> int:
-    return raise_for_status(await client.get("/relation", params={"fid": uid}))[
-        "attribute"
-    ]
+    async with limiters["relation"]:
+        return raise_for_status(await client.get("/relation", params={"fid": uid}))[
+            "attribute"
+        ]
 
 
 async def modify_relation(uid: int, act: int) -> None:
-    raise_for_status(
-        await client.post(
-            "/relation/modify",
-            data={"fid": uid, "act": act, "csrf": client.cookies["bili_jct"]},
+    async with limiters["relation"]:
+        raise_for_status(
+            await client.post(
+                "/relation/modify",
+                data={"fid": uid, "act": act, "csrf": client.cookies["bili_jct"]},
+            )
         )
-    )
+
+
+ASSET_TYPES = {"font", "image", "script", "stylesheet"}
+HOP_HEADERS = {"connection", "content-encoding", "content-length", "transfer-encoding"}
+asset_cache = LRUCache(
+    plugin_config.asset_cache_size,
+    path=store.get_plugin_cache_dir() / "asset",
+    disk_maxsize=plugin_config.asset_cache_disk_size,
+)
+uncacheable: OrderedDict[str, None] = OrderedDict()
+
+
+def is_cacheable(request: Request) -> bool:
+    if request.method != "GET" or request.resource_type not in ASSET_TYPES:
+        return False
+
+    host = urlsplit(request.url).hostname or ""
+    if not any(
+        host == suffix or host.endswith(f".{suffix}")
+        for suffix in plugin_config.asset_hosts
+    ):
+        return False
+
+    return request.url not in uncacheable
+
+
+def mark_uncacheable(url: str) -> None:
+    uncacheable[url] = None
+    if len(uncacheable) > plugin_config.asset_uncacheable_size:
+        uncacheable.popitem(last=False)
+
+
+def get_max_age(headers: dict[str, str]) -> int:
+    cache_control = headers.get("cache-control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    if match := re.search(r"max-age=(\d+)", cache_control):
+        return int(match[1])
+    return 0
+
+
+BLOCK_PATTERN = re.compile("|".join(plugin_config.block_patterns) or "(?!)")
+stats: defaultdict[Page, Counter[str]] = defaultdict(Counter)
+
+
+def get_stats(request: Request) -> Counter[str]:
+    try:
+        return stats[request.frame.page]
+    except Error:
+        return Counter()
+
+
+async def route_block(route: Route) -> None:
+    request = route.request
+    if request.resource_type in plugin_config.block_resource_types or (
+        BLOCK_PATTERN.search(request.url)
+    ):
+        get_stats(request)["blocked"] += 1
+        return await route.abort("blockedbyclient")
+
+    await route.fallback()
+
+
+async def route_asset(route: Route) -> None:
+    request = route.request
+    if not is_cacheable(request):
+        return await route.fallback()
+
+    headers: dict[str, str] = {}
+    body = b""
+    if (entry := asset_cache.get(request.url)) is not None:
+        meta, body = entry.split(b"\0", 1)
+        expires, headers = loads(meta)
+        if time() < expires:
+            get_stats(request).update(cached=1, cached_bytes=len(body))
+            return await route.fulfill(headers=headers, body=body)
+
+    try:
+        response = await route.fetch(
+            headers=(
+                {**request.headers, "if-none-match": headers["etag"]}
+                if "etag" in headers
+                else None
+            )
+        )
+    except Error as e:
+        logger.debug(f"Failed to fetch asset {request.url}: {e!r}")
+        if entry is None:
+            return await route.fallback()
+
+        get_stats(request).update(stale=1, cached_bytes=len(body))
+        return await route.fulfill(headers=headers, body=body)
+
+    if entry is not None and response.status == 304:
+        max_age = get_max_age(response.headers) or get_max_age(headers)
+    elif response.status == 200:
+        max_age = get_max_age(response.headers)
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name not in HOP_HEADERS
+        }
+        body = await response.body()
+    else:
+        return await route.fulfill(response=response)
+
+    if max_age >= plugin_config.asset_min_ttl:
+        asset_cache.set(
+            request.url, dumps([time() + max_age, headers]).encode() + b"\0" + body
+        )
+    else:
+        mark_uncacheable(request.url)
+
+    await route.fulfill(headers=headers, body=body)
 
 
 _context: BrowserContext | None = None
+context_lock = Lock()
+
+STYLE = """
+    body {
+      font-family: "LXGW ZhenKai GB", "LXGW WenKai GB", sans-serif !important;
+    }
+
+    :not(
+      .opus-modules,
+      .dyn-card,
+      .opus-modules *,
+      .dyn-card *,
+      :has(.opus-modules, .dyn-card)
+    ),
+    .opus-read-more,
+    .opus-module-stat,
+    .dyn-share {
+      display: none !important;
+    }
+    .opus-module-content.limit {
+      overflow: unset !important;
+      max-height: unset !important;
+      position: unset !important;
+      padding-bottom: unset !important;
+    }
+"""
 
 
 async def get_context() -> BrowserContext:
     global _context
 
-    if _context and _context.browser and _context.browser.is_connected():
-        return _context
+    async with context_lock:
+        if not (_context and _context.browser and _context.browser.is_connected()):
+            _context = await new_context()
 
-    _context = await (await get_browser()).new_context(
-        **plugin_config.screenshot_device
-    )
-    await _context.add_cookies(
+    return _context
+
+
+async def new_context() -> BrowserContext:
+    context = await (await get_browser()).new_context(**plugin_config.screenshot_device)
+    await context.add_cookies(
         [
             {"name": name, "value": value, "domain": ".bilibili.com", "path": "/"}
             for name, value in bilibili_config.cookies.items()
         ]
     )
-    await _context.add_cookies(
+    await context.add_cookies(
         [
             {
                 "name": "SESSDATA",
@@ -154,127 +320,366 @@ async def get_context() -> BrowserContext:
         ]
     )
 
+    await context.add_init_script(
+        f"""
+            document.addEventListener("DOMContentLoaded", () => {{
+              const style = document.createElement("style");
+              style.textContent = {dumps(STYLE)};
+              document.head.append(style);
+            }});
+        """
+    )
+
+    await context.route("**/*", route_asset)
+
     pattern = "@540w_540h_1c.webp"
-    await _context.route(
+    await context.route(
         "**/*" + pattern,
-        lambda route: route.continue_(
+        lambda route: route.fallback(
             url=route.request.url[: -len(pattern)] + "@540w_540h_1c_!header.webp"
         ),
     )
 
-    return _context
+    await context.route("**/*", route_block)
+
+    return context
+
 
+class PagePool:
+    size: int
+    max_uses: int
+    pages: list[Page]
+    uses: dict[Page, int]
 
-@asynccontextmanager
-async def get_new_page(**kwargs) -> AsyncGenerator[Page, Any]:
-    async with await (await get_context()).new_page(**kwargs) as page:
-        await (await page.context.new_cdp_session(page)).send(
+    def __init__(self, size: int, max_uses: int) -> None:
+        self.size = size
+        self.max_uses = max_uses
+        self.pages = []
+        self.uses = {}
+
+    def is_healthy(self, page: Page) -> bool:
+        return (
+            not page.is_closed()
+            and page.context is _context
+            and self.uses[page] < self.max_uses
+        )
+
+    async def new_page(self) -> Page:
+        context = await get_context()
+        page = await context.new_page()
+        await (await context.new_cdp_session(page)).send(
             "Network.setCacheDisabled", {"cacheDisabled": False}
         )
-        yield page
+        self.uses[page] = 0
+        return page
+
+    async def close(self, page: Page) -> None:
+        del self.uses[page]
+        stats.pop(page, None)
+        with suppress(Exception):
+            await page.close()
+
+    async def fill(self) -> None:
+        while len(self.pages) < self.size:
+            self.pages.append(await self.new_page())
+
+    async def checkout(self) -> Page:
+        await get_context()
+
+        while self.pages:
+            if self.is_healthy(page := self.pages.pop()):
+                return page
+            await self.close(page)
+
+        return await self.new_page()
+
+    async def checkin(self, page: Page) -> None:
+        self.uses[page] += 1
+
+        if self.is_healthy(page) and len(self.pages) < self.size:
+            with suppress(Exception):
+                await page.goto("about:blank")
+                return self.pages.append(page)
+
+        await self.close(page)
+
+    @asynccontextmanager
+    async def get_page(self) -> AsyncGenerator[Page, Any]:
+        page = await self.checkout()
+        try:
+            yield page
+        except BaseException:
+            await self.close(page)
+            raise
+        await self.checkin(page)
+
+
+page_pool = PagePool(plugin_config.page_pool_size, plugin_config.page_max_uses)
+
+
+READY_SCRIPT = """
+    (element) => Promise.all([
+      document.fonts.ready,
+      ...Array.from(element.querySelectorAll("img"), (img) => {
+        img.loading = "eager";
+        return img.decode().catch(() => {});
+      }),
+    ])
+"""
 
 
 @backoff.on_exception(backoff.constant, Exception, max_tries=3)
 async def render_screenshot(id_str: str) -> bytes:
-    async with get_new_page() as page:
+    budget = plugin_config.screenshot_budget
+
+    async with page_pool.get_page() as page:
+        stats.pop(page, None)
+
+        start = perf_counter()
         await page.goto(
-            f"https://m.bilibili.com/opus/{id_str}", wait_until="domcontentloaded"
+            f"https://m.bilibili.com/opus/{id_str}",
+            timeout=budget * 1000,
+            wait_until="domcontentloaded",
         )
-        await page.add_style_tag(
-            content="""
-                body {
-                  font-family: "LXGW ZhenKai GB", "LXGW WenKai GB", sans-serif !important;
-                }
-
-                :not(
-                  .opus-modules,
-                  .dyn-card,
-                  .opus-modules *,
-                  .dyn-card *,
-                  :has(.opus-modules, .dyn-card)
-                ),
-                .opus-read-more,
-                .opus-module-stat,
-                .dyn-share {
-                  display: none !important;
-                }
-                .opus-module-content.limit {
-                  overflow: unset !important;
-                  max-height: unset !important;
-                  position: unset !important;
-                  padding-bottom: unset !important;
-                }
-            """
+        loaded = perf_counter()
+
+        locator = page.locator(".opus-modules, .dyn-card").first
+        await locator.wait_for(
+            state="attached", timeout=max(budget - (loaded - start), 0.001) * 1000
         )
-        await page.wait_for_load_state("networkidle")
-        screenshot = await page.locator(".opus-modules, .dyn-card").first.screenshot(
-            type="jpeg"
+        attached = perf_counter()
+
+        try:
+            async with timeout(
+                budget - plugin_config.screenshot_capture_budget - (attached - start)
+            ):
+                await locator.evaluate(READY_SCRIPT)
+        except TimeoutError:
+            logger.warning(f"Screenshot dynamic {id_str} not ready within budget")
+        ready = perf_counter()
+
+        screenshot = await locator.screenshot(
+            type="jpeg", timeout=max(budget - (ready - start), 0.001) * 1000
+        )
+        captured = perf_counter()
+
+        counter = stats.pop(page, Counter())
+        logger.debug(
+            f"Screenshot dynamic {id_str}: "
+            f"load {loaded - start:.3f}s, attach {attached - loaded:.3f}s, "
+            f"ready {ready - attached:.3f}s, capture {captured - ready:.3f}s; "
+            f"blocked {counter['blocked']} requests, "
+            f"served {counter['cached']} assets ({counter['cached_bytes']} bytes) "
+            "from cache"
         )
 
     return screenshot
 
 
-async def broadcast(dynamics: list[Dynamic]):
+env, TEMPLATE_VERSION = load_templates(files(templates))
+draw_template = env.get_template("draw.html.j2")
+SCREENSHOT_VERSION = sha256(STYLE.encode()).hexdigest()
+render_cache = LRUCache(
+    plugin_config.render_cache_size,
+    path=store.get_plugin_cache_dir() / "render",
+    disk_maxsize=plugin_config.render_cache_disk_size,
+)
+
+
+async def render(dynamic: Dynamic) -> bytes:
+    if dynamic["type"] == "DYNAMIC_TYPE_WORD" or (
+        dynamic["type"] == "DYNAMIC_TYPE_DRAW"
+        and not dynamic["modules"]["module_dynamic"]["additional"]
+    ):
+        key = f"{dynamic['id_str']}:htmlkit:{TEMPLATE_VERSION}"
+        render_uncached = partial(render_template, dynamic)
+    else:
+        key = f"{dynamic['id_str']}:playwright:{SCREENSHOT_VERSION}"
+        render_uncached = partial(render_screenshot, dynamic["id_str"])
+
+    if (image := render_cache.get(key)) is None:
+        image = await render_uncached()
+        render_cache.set(key, image)
+
+    return image
+
+
+async def render_template(dynamic: Dynamic) -> bytes:
+    image = await html_to_pic(
+        await draw_template.render_async(dynamic),
+        max_width=360 * 3,
+        device_height=640 * 3,
+        img_fetch_fn=img_fetch_fn,
+        allow_refit=False,
+        image_format="jpeg",
+        jpeg_quality=80,
+    )
+
+    logger.debug(f"Rendered dynamic {dynamic['id_str']}: {img_cache}, {img_flight}")
+    return image
+
+
+render_stage = Stage("render", plugin_config.render_concurrency)
+share_stage = Stage("share", plugin_config.share_concurrency)
+send_stage = Stage("send", plugin_config.send_concurrency)
+authors: dict[int, Task] = {}
+subscriptions = SubscriptionIndex(Subscription)
+
+
+async def process(dynamic: Dynamic, prev: Task | None) -> None:
+    author = dynamic["modules"]["module_author"]
+
+    results = await gather(
+        render_stage(render(dynamic)),
+        share_stage(
+            get_share_click(dynamic["id_str"], "dynamic", "dt.dt-detail.0.0.pv")
+        ),
+        return_exceptions=True,
+    )
+    if failed := [
+        f"{stage.name}: {result!r}"
+        for stage, result in zip((render_stage, share_stage), results)
+        if isinstance(result, BaseException)
+    ]:
+        logger.error(
+            f"Failed to broadcast dynamic {dynamic['id_str']}: {', '.join(failed)}"
+        )
+        return
+
+    screenshot, url = results
+    logger.debug(
+        f"Rendered dynamic {dynamic['id_str']}: "
+        f"{render_stage}, {share_stage}, {send_stage}"
+    )
+
+    msg = plugin_config.template.format(
+        name=author["name"],
+        action=author["pub_action"] or plugin_config.types[dynamic["type"]],
+        screenshot=Image(raw=screenshot),
+        url=url,
+    )
+
+    if prev:
+        await wait([prev])
+
+    try:
+        await send_stage(send_messages(subscriptions[author["mid"]], msg))
+    except Exception as e:
+        logger.error(
+            f"Failed to broadcast dynamic {dynamic['id_str']}: "
+            f"{send_stage.name}: {e!r}"
+        )
+
+
+def release(mid: int, task: Task) -> None:
+    if authors.get(mid) is task:
+        del authors[mid]
+
+
+async def broadcast(dynamics: list[Dynamic]) -> None:
+    for dynamic in dynamics:
+        mid = dynamic["modules"]["module_author"]["mid"]
+        authors[mid] = run_task(process(dynamic, authors.get(mid)))
+        authors[mid].add_done_callback(partial(release, mid))
+
+
+async def save_cache() -> None:
     async with get_session() as session:
-        for dynamic in dynamics:
-            with as_file(files(templates)) as templates_path:
-                screenshot, url, subs = await gather(
-                    (
-                        template_to_pic(
-                            str(templates_path),
-                            "draw.html.j2",
-                            dynamic,
-                            max_width=360 * 3,
-                            device_height=640 * 3,
-                            img_fetch_fn=img_fetch_fn,
-                            allow_refit=False,
-                            image_format="jpeg",
-                            jpeg_quality=80,
-                        )
-                        if dynamic["type"] == "DYNAMIC_TYPE_WORD"
-                        or (
-                            dynamic["type"] == "DYNAMIC_TYPE_DRAW"
-                            and not dynamic["modules"]["module_dynamic"]["additional"]
-                        )
-                        else render_screenshot(dynamic["id_str"])
-                    ),
-                    get_share_click(
-                        dynamic["id_str"], "dynamic", "dt.dt-detail.0.0.pv"
-                    ),
-                    session.scalars(
-                        select(Subscription).where(
-                            Subscription.uid
-                            == dynamic["modules"]["module_author"]["mid"]
-                        )
-                    ),
-                )
+        seen = set(await session.scalars(select(Seen.id)))
+        ids = set(cache.data)
 
-            msg = plugin_config.template.format(
-                name=dynamic["modules"]["module_author"]["name"],
-                action=dynamic["modules"]["module_author"]["pub_action"]
-                or plugin_config.types[dynamic["type"]],
-                screenshot=Image(raw=screenshot),
-                url=url,
-            )
-            run_task(gather(*(send_message(sub.scene, msg) for sub in subs)))
+        await session.execute(delete(Seen).where(Seen.id.in_(seen - ids)))
+        session.add_all(Seen(id=id) for id in ids - seen)
+        await session.commit()
+
+
+async def get_new_dynamics() -> list[Dynamic]:
+    global _baseline
+
+    dynamics: list[Dynamic] = []
+    replay = not _baseline
+
+    if _baseline and not await get_update_num(_baseline):
+        return dynamics
+
+    offset = ""
+    while True:
+        data = await get_dynamics(offset)
+        if not offset:
+            _baseline = data["update_baseline"]
+
+        new = set(cache.replace_many(int(item["id_str"]) for item in data["items"]))
+        dynamics.extend(item for item in data["items"] if int(item["id_str"]) in new)
+
+        if len(new) < len(data["items"]) or not data["has_more"]:
+            break
+
+        offset = data["offset"]
+
+    if not dynamics:
+        return dynamics
+
+    await save_cache()
+
+    if replay and (skipped := len(dynamics) - plugin_config.replay_limit) > 0:
+        logger.warning(f"Skipped {skipped} missed dynamics beyond replay limit")
+        return dynamics[: plugin_config.replay_limit]
+
+    return dynamics
 
 
 @driver.on_startup
 async def _() -> None:
-    for page in range(1, 5):
-        for item in (await get_dynamics(page))["items"]:
-            cache.push(item["id_str"])
+    run_task(page_pool.fill())
+
+
+@driver.on_startup
+async def _() -> None:
+    await subscriptions.load()
+
+
+@scheduler.scheduled_job("interval", hours=1)
+async def _() -> None:
+    await subscriptions.check()
+
+
+@driver.on_startup
+async def _() -> None:
+    global _baseline
+
+    async with get_session() as session:
+        for id in await session.scalars(select(Seen.id)):
+            cache.push(id)
+
+    if cache:
+        return
+
+    offset = ""
+    for _ in range(4):
+        data = await get_dynamics(offset)
+        if not offset:
+            _baseline = data["update_baseline"]
+
+        for item in data["items"]:
+            cache.push(int(item["id_str"]))
+
+        offset = data["offset"]
+
+    await save_cache()
 
 
 @scheduler.scheduled_job("interval", seconds=plugin_config.interval)
 async def _() -> None:
+    if limiters["feed"].throttled:
+        logger.debug(f"Skipped dynamic polling: {limiters['feed']}")
+        return
+
     run_task(
         broadcast(
             [
                 dynamic
-                for dynamic in (await get_dynamics())["items"]
-                if cache.replace(dynamic["id_str"])
-                and dynamic["type"] in plugin_config.types
+                for dynamic in await get_new_dynamics()
+                if dynamic["type"] in plugin_config.types
             ]
         )
     )
@@ -308,6 +713,7 @@ async def _(
 
     db.add(Subscription(uid=uid, scene_id=scene.id))
     await db.commit()
+    subscriptions.add(uid, scene)
     await UniMessage(f"成功订阅 UID:{uid} 的动态").send()
 
 
@@ -328,6 +734,7 @@ async def _(
             await handle_error("取订B站动态失败")
 
     await db.commit()
+    subscriptions.remove(uid, scene.id)
     await UniMessage(f"成功取订 UID:{uid} 的动态").send()
 
 
@@ -348,55 +755,37 @@ async def _(db: async_scoped_session, scene: Annotated[SceneModel, SceneOrm()]):
 @cmd.assign("展示")
 async def _(id_str: str):
     try:
-        dynamic = raise_for_status(
-            await client.get(
-                "/polymer/web-dynamic/v1/detail",
-                params={
-                    "id": id_str,
-                    "features": ",".join(
-                        (
-                            "itemOpusStyle",
-                            "listOnlyfans",
-                            "opusBigCover",
-                            "onlyfansVote",
-                            "decorationCard",
-                            "onlyfansAssetsV2",
-                            "forwardListHidden",
-                            "ugcDelete",
-                            "onlyfansQaCard",
-                            "commentsNewVersion",
-                            "avatarAutoTheme",
-                        )
-                    ),
-                },
-            )
-        )["item"]
+        async with limiters["feed"]:
+            dynamic = raise_for_status(
+                await client.get(
+                    "/polymer/web-dynamic/v1/detail",
+                    params={
+                        "id": id_str,
+                        "features": ",".join(
+                            (
+                                "itemOpusStyle",
+                                "listOnlyfans",
+                                "opusBigCover",
+                                "onlyfansVote",
+                                "decorationCard",
+                                "onlyfansAssetsV2",
+                                "forwardListHidden",
+                                "ugcDelete",
+                                "onlyfansQaCard",
+                                "commentsNewVersion",
+                                "avatarAutoTheme",
+                            )
+                        ),
+                    },
+                )
+            )["item"]
     except Exception:
         await handle_error("获取动态信息失败")
 
-    with as_file(files(templates)) as templates_path:
-        screenshot, url = await gather(
-            (
-                template_to_pic(
-                    str(templates_path),
-                    "draw.html.j2",
-                    dynamic,
-                    max_width=360 * 3,
-                    device_height=640 * 3,
-                    img_fetch_fn=img_fetch_fn,
-                    allow_refit=False,
-                    image_format="jpeg",
-                    jpeg_quality=80,
-                )
-                if dynamic["type"] == "DYNAMIC_TYPE_WORD"
-                or (
-                    dynamic["type"] == "DYNAMIC_TYPE_DRAW"
-                    and not dynamic["modules"]["module_dynamic"]["additional"]
-                )
-                else render_screenshot(dynamic["id_str"])
-            ),
-            get_share_click(id_str, "dynamic", "dt.dt-detail.0.0.pv"),
-        )
+    screenshot, url = await gather(
+        render_stage(render(dynamic)),
+        share_stage(get_share_click(id_str, "dynamic", "dt.dt-detail.0.0.pv")),
+    )
     await plugin_config.template.format(
         name=dynamic["modules"]["module_author"]["name"],
         action=dynamic["modules"]["module_author"]["pub_action"]
@@ -9,6 +9,38 @@ from src.utils import with_prefix
 
 class Config(BaseModel):
     interval: int = 10
+    cache_size: int = 100
+    replay_limit: int = 10
+    render_concurrency: int = 2
+    share_concurrency: int = 4
+    send_concurrency: int = 4
+    page_pool_size: int = 2
+    page_max_uses: int = 50
+    screenshot_budget: float = 10
+    screenshot_capture_budget: float = 2
+    render_cache_size: int = 64 << 20
+    render_cache_disk_size: int = 512 << 20
+    img_cache_size: int = 32 << 20
+    img_cache_ttl: int = 24 * 60 * 60
+    img_cache_disk_size: int = 256 << 20
+    asset_cache_size: int = 64 << 20
+    asset_cache_disk_size: int = 256 << 20
+    asset_min_ttl: int = 60 * 60
+    asset_hosts: set[str] = {"hdslb.com", "biliimg.com"}
+    asset_uncacheable_size: int = 4096
+    block_resource_types: set[str] = {
+        "eventsource",
+        "manifest",
+        "media",
+        "other",
+        "texttrack",
+    }
+    block_patterns: list[str] = [
+        r"^https?://(?:data|cm)\.bilibili\.com/",
+        r"^https?://api\.bilibili\.com/x/(?:v2/reply|player|internal/gaia)",
+        r"^https?://[^/]+/bfs/seed/log/",
+        r"^https?://[^/]*(?:hm\.baidu|google-analytics|googletagmanager)\.com/",
+    ]
     screenshot_device: dict[str, Any] = {
         "user_agent": "Mozilla/5.0 (Linux; Android 7.0; Moto G (4)) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.6099.28 Mobile Safari/537.36",
         "viewport": {"width": 360, "height": 640},
@@ -26,6 +26,7 @@ class Dynamic(TypedDict):
 class Dynamics(TypedDict):
     has_more: bool
     items: list[Dynamic]
+    offset: str
     update_baseline: str
     update_num: int
 
@@ -44,3 +45,7 @@ class Subscription(Model):
 
     def __hash__(self) -> int:
         return hash((self.uid, self.scene_id))
+
+
+class Seen(Model):
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
@@ -1,9 +1,11 @@
-from asyncio import gather
+from asyncio import Semaphore, gather, sleep, timeout
+from contextlib import suppress
+from functools import partial
+from itertools import count
 from time import time
 from typing import Annotated
 
-from httpx import AsyncClient
-from nonebot import get_driver, get_plugin_config
+from nonebot import get_driver, get_plugin_config, logger, require
 from nonebot.permission import SUPERUSER
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_alconna import (
@@ -15,16 +17,30 @@ from nonebot_plugin_alconna import (
     on_alconna,
 )
 from nonebot_plugin_apscheduler import scheduler
-from nonebot_plugin_orm import async_scoped_session, get_session
+from nonebot_plugin_orm import async_scoped_session
 from nonebot_plugin_uninfo import MEMBER
 from nonebot_plugin_uninfo.orm import SceneModel, SceneOrm
 from sqlalchemy import select
 
-from .....utils import run_task, send_message
-from ...utils import UID_ARG, get_share_click, handle_error, raise_for_status
+from .....cache import LRUCache, SingleFlight
+from .....media import send_messages
+from .....utils import USER_AGENT, Priority, Stage, get_client, run_task
+from ...utils import (
+    UID_ARG,
+    SubscriptionIndex,
+    get_share_click,
+    handle_error,
+    limiters,
+    raise_for_status,
+)
 from .config import Config
+from .danmaku import Danmaku
 from .models import RoomInfo, Subscription
 
+require("nonebot_plugin_localstore")
+
+import nonebot_plugin_localstore as store
+
 __plugin_meta__ = PluginMetadata(
     name="bilibili.live",
     description="",
@@ -35,19 +51,53 @@ __plugin_meta__ = PluginMetadata(
 driver = get_driver()
 global_config = driver.config
 plugin_config = get_plugin_config(Config)
+interval = plugin_config.ws_interval if plugin_config.ws else plugin_config.interval
 
 room_infos: dict[int, RoomInfo] = {}
-client = AsyncClient(
-    headers={
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
-    }
+rooms: dict[int, int] = {}
+versions: dict[int, int] = {}
+sequence = count()
+status_semaphore = Semaphore(plugin_config.status_concurrency)
+cover_cache = LRUCache(
+    plugin_config.cover_cache_size,
+    path=store.get_plugin_cache_dir() / "cover",
+    disk_maxsize=plugin_config.cover_cache_disk_size,
 )
+cover_flight = SingleFlight[bytes]()
+cover_stage = Stage("cover", plugin_config.cover_prefetch_concurrency)
+subscriptions = SubscriptionIndex(Subscription)
+client = get_client("bilibili.live", headers={"user-agent": USER_AGENT})
+
+
+def get_cover_url(info: RoomInfo) -> str:
+    return info["cover_from_user"] or info["face"]
+
+
+async def fetch_cover(url: str) -> bytes:
+    resp = await client.get(url)
+    if resp.is_success:
+        cover_cache.set(url, resp.content)
+    return resp.content
+
+
+async def get_cover(info: RoomInfo) -> bytes:
+    url = get_cover_url(info)
+    if (content := cover_cache.get(url)) is None:
+        content = await cover_flight(url, partial(fetch_cover, url))
+    return content
+
+
+async def prefetch_cover(info: RoomInfo) -> None:
+    with suppress(Exception):
+        await cover_stage(get_cover(info))
 
 
 async def get_status_info_by_uids(uids: list[int]) -> dict[int, RoomInfo]:
-    return (
-        {
+    if not uids:
+        return {}
+
+    async with limiters["live"]:
+        return {
             int(uid): info
             for uid, info in raise_for_status(
                 await client.post(
@@ -56,45 +106,83 @@ async def get_status_info_by_uids(uids: list[int]) -> dict[int, RoomInfo]:
                 )
             ).items()
         }
-        if uids
-        else {}
-    )
 
 
 async def broadcast(uids: list[int]) -> None:
-    async with get_session() as session:
-        for uid in uids:
-            info = room_infos[uid]
-            subs = await session.scalars(
-                select(Subscription).where(Subscription.uid == uid)
+    for uid in uids:
+        info = room_infos[uid]
+        if info["live_status"] and time() - info["live_time"] < interval + 10:
+            cover, url = await gather(
+                get_cover(info),
+                get_share_click(
+                    info["room_id"],
+                    "vertical-three-point",
+                    "live.live-room-detail.0.0.pv",
+                ),
             )
-            if info["live_status"] and time() - info["live_time"] < max(
-                plugin_config.interval, 10
-            ):
-                cover, url = await gather(
-                    client.get(info["cover_from_user"] or info["face"]),
-                    get_share_click(
-                        info["room_id"],
-                        "vertical-three-point",
-                        "live.live-room-detail.0.0.pv",
-                    ),
-                )
 
-                msg = plugin_config.live_template.format(
-                    url=url, cover=Image(raw=cover.content), **info
-                )
-            else:
-                msg = plugin_config.preparing_template.format(**info)
+            msg = plugin_config.live_template.format(
+                url=url, cover=Image(raw=cover), **info
+            )
+            priority = Priority.HIGH
+        else:
+            msg = plugin_config.preparing_template.format(**info)
+            priority = Priority.NORMAL
 
-            run_task(gather(*(send_message(sub.scene, msg) for sub in subs)))
+        run_task(send_messages(subscriptions[uid], msg, priority))
 
 
-@scheduler.scheduled_job("interval", seconds=plugin_config.interval)
+@driver.on_startup
 async def _() -> None:
-    async with get_session() as session:
-        uids = list(await session.scalars(select(Subscription.uid)))
+    await subscriptions.load()
+    run_task(reconcile())
+
+
+@scheduler.scheduled_job("interval", hours=1)
+async def _() -> None:
+    await subscriptions.check()
+
 
-    curr_room_infos = await get_status_info_by_uids(uids)
+async def on_event(room_id: int, cmd: str) -> None:
+    if (uid := rooms.get(room_id)) is None:
+        return
+
+    await update([uid])
+    if cmd != "LIVE":
+        return
+
+    for _ in range(plugin_config.ws_live_retries):
+        if uid in room_infos and room_infos[uid]["live_status"]:
+            return
+
+        await sleep(plugin_config.ws_live_retry_delay)
+        await update([uid])
+
+
+danmaku = Danmaku(
+    client,
+    on_event,
+    plugin_config.ws_url,
+    plugin_config.ws_heartbeat,
+    plugin_config.ws_reconnect,
+)
+
+
+async def update(uids: list[int]) -> None:
+    async with status_semaphore:
+        seq = next(sequence)
+        try:
+            async with timeout(plugin_config.status_timeout):
+                curr_room_infos = await get_status_info_by_uids(uids)
+        except Exception as e:
+            logger.warning(f"Failed to fetch live status of {len(uids)} uids: {e!r}")
+            return
+
+    for uid in list(curr_room_infos):
+        if versions.get(uid, -1) > seq:
+            del curr_room_infos[uid]
+        else:
+            versions[uid] = seq
 
     run_task(
         broadcast(
@@ -106,9 +194,38 @@ async def _() -> None:
         )
     )
 
+    for uid, info in curr_room_infos.items():
+        prev = room_infos.get(uid)
+        if prev and get_cover_url(prev) != get_cover_url(info):
+            run_task(prefetch_cover(info))
+
     room_infos.update(curr_room_infos)
 
 
+@scheduler.scheduled_job("interval", seconds=interval)
+async def reconcile() -> None:
+    if limiters["live"].throttled:
+        logger.debug(f"Skipped live polling: {limiters['live']}")
+        return
+
+    uids = list(subscriptions)
+    size = plugin_config.status_chunk_size
+
+    await gather(*(update(uids[i : i + size]) for i in range(0, len(uids), size)))
+
+    if plugin_config.ws:
+        rooms.clear()
+        rooms.update(
+            (room_infos[uid]["room_id"], uid) for uid in uids if uid in room_infos
+        )
+        danmaku.sync(set(rooms))
+
+
+@driver.on_shutdown
+async def _() -> None:
+    danmaku.close()
+
+
 cmd = on_alconna(
     Alconna(
         "B站直播",
@@ -143,6 +260,7 @@ async def _(
 
     db.add(Subscription(uid=uid, scene_id=scene.id))
     await db.commit()
+    subscriptions.add(uid, scene)
     await UniMessage(
         f"成功订阅 {info['uname']} (UID:{uid}) 的直播 ({info['room_id']})"
     ).send()
@@ -157,6 +275,7 @@ async def _(
 
     await db.delete(sub)
     await db.commit()
+    subscriptions.remove(uid, scene.id)
     await UniMessage(f"成功取订 UID:{uid} 的直播").send()
 
 
@@ -188,8 +307,8 @@ async def _(uid: int):
         get_share_click(
             info["room_id"], "vertical-three-point", "live.live-room-detail.0.0.pv"
         ),
-        client.get(info["cover_from_user"] or info["face"]),
+        get_cover(info),
     )
     await plugin_config.live_template.format(
-        url=url, cover=Image(raw=cover.content), **info
+        url=url, cover=Image(raw=cover), **info
     ).exclude(AtAll).send()
@@ -7,6 +7,19 @@ from src.utils import with_prefix
 
 class Config(BaseModel):
     interval: int = 1
+    status_chunk_size: int = 500
+    status_concurrency: int = 4
+    status_timeout: float = 5
+    cover_cache_size: int = 32 << 20
+    cover_cache_disk_size: int = 256 << 20
+    cover_prefetch_concurrency: int = 2
+    ws: bool = False
+    ws_url: str | None = None
+    ws_interval: int = 60
+    ws_heartbeat: float = 30
+    ws_reconnect: float = 5
+    ws_live_retries: int = 3
+    ws_live_retry_delay: float = 5
     live_template: UniMessageTemplate = UniMessage.template(
         "{:AtAll()} {uname} 正在直播 {title}{cover}{url}"
     )
@@ -0,0 +1,166 @@
+import zlib
+from asyncio import CancelledError, Task, create_task, sleep
+from collections.abc import Awaitable, Callable, Iterator
+from enum import IntEnum
+from json import dumps, loads
+from struct import Struct
+
+from httpx import AsyncClient
+from nonebot import get_driver, logger
+from nonebot.drivers import Request, WebSocket, WebSocketClientMixin
+
+from .....utils import run_task
+from ...utils import Limiter, raise_for_status
+
+HEADER = Struct(">IHHII")
+DEFAULT_URL = "wss://broadcastlv.chat.bilibili.com/sub"
+
+limiter = Limiter("danmaku", 1, 5)
+
+
+class Op(IntEnum):
+    HEARTBEAT = 2
+    HEARTBEAT_REPLY = 3
+    MESSAGE = 5
+    AUTH = 7
+    AUTH_REPLY = 8
+
+
+def pack(op: int, body: bytes = b"") -> bytes:
+    return HEADER.pack(HEADER.size + len(body), HEADER.size, 1, op, 1) + body
+
+
+def unpack(data: bytes) -> Iterator[tuple[int, bytes]]:
+    offset = 0
+    while offset < len(data):
+        length, header_length, protover, op, _ = HEADER.unpack_from(data, offset)
+        body = data[offset + header_length : offset + length]
+        offset += length
+
+        if op == Op.MESSAGE and protover == 2:
+            yield from unpack(zlib.decompress(body))
+        else:
+            yield op, body
+
+
+class Danmaku:
+    client: AsyncClient
+    callback: Callable[[int, str], Awaitable[None]]
+    url: str | None
+    heartbeat_interval: float
+    reconnect_delay: float
+    tasks: dict[int, Task]
+    connected: set[int]
+    events: int
+    reconnects: int
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        callback: Callable[[int, str], Awaitable[None]],
+        url: str | None = None,
+        heartbeat_interval: float = 30,
+        reconnect_delay: float = 5,
+    ) -> None:
+        self.client = client
+        self.callback = callback
+        self.url = url
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_delay = reconnect_delay
+        self.tasks = {}
+        self.connected = set()
+        self.events = 0
+        self.reconnects = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"Danmaku(rooms={len(self.tasks)}, connected={len(self.connected)}, "
+            f"events={self.events}, reconnects={self.reconnects})"
+        )
+
+    def sync(self, room_ids: set[int]) -> None:
+        for room_id in self.tasks.keys() - room_ids:
+            self.tasks.pop(room_id).cancel()
+            self.connected.discard(room_id)
+
+        for room_id in room_ids - self.tasks.keys():
+            self.tasks[room_id] = create_task(self.run(room_id))
+
+    def close(self) -> None:
+        self.sync(set())
+
+    async def get_server(self, room_id: int) -> tuple[str, str]:
+        if self.url:
+            return self.url, ""
+
+        try:
+            async with limiter:
+                data = raise_for_status(
+                    await self.client.get(
+                        "https://api.live.bilibili.com/xlive/web-room/v1/index/getDanmuInfo",
+                        params={"id": room_id, "type": 0},
+                    )
+                )
+        except Exception as e:
+            logger.debug(f"Failed to get danmaku server of room {room_id}: {e!r}")
+            return DEFAULT_URL, ""
+
+        host = data["host_list"][0]
+        return f"wss://{host['host']}:{host['wss_port']}/sub", data["token"]
+
+    async def run(self, room_id: int) -> None:
+        driver = get_driver()
+        assert isinstance(driver, WebSocketClientMixin)
+
+        delay = self.reconnect_delay
+        while True:
+            try:
+                url, key = await self.get_server(room_id)
+                async with driver.websocket(Request("GET", url, timeout=30)) as ws:
+                    await ws.send_bytes(
+                        pack(
+                            Op.AUTH,
+                            dumps(
+                                {
+                                    "uid": 0,
+                                    "roomid": room_id,
+                                    "protover": 2,
+                                    "platform": "web",
+                                    "type": 2,
+                                    "key": key,
+                                }
+                            ).encode(),
+                        )
+                    )
+
+                    heartbeat = create_task(self.heartbeat(ws))
+                    try:
+                        while True:
+                            for op, body in unpack(await ws.receive_bytes()):
+                                if op == Op.AUTH_REPLY:
+                                    delay = self.reconnect_delay
+                                    self.connected.add(room_id)
+                                elif op == Op.MESSAGE:
+                                    self.handle(room_id, body)
+                    finally:
+                        heartbeat.cancel()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Danmaku connection of room {room_id} lost: {e!r}")
+
+            self.connected.discard(room_id)
+            self.reconnects += 1
+            await sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def heartbeat(self, ws: WebSocket) -> None:
+        while True:
+            await ws.send_bytes(pack(Op.HEARTBEAT))
+            await sleep(self.heartbeat_interval)
+
+    def handle(self, room_id: int, body: bytes) -> None:
+        if (cmd := loads(body).get("cmd")) in ("LIVE", "PREPARING"):
+            self.events += 1
+            logger.debug(f"Received {cmd} of room {room_id}: {self}")
+            run_task(self.callback(room_id, cmd))
@@ -1,12 +1,24 @@
-from nonebot import get_driver, get_plugin_config, on_regex
-from nonebot.params import RegexStr
+from asyncio import gather
+from collections.abc import Callable
+from functools import partial
+
+from nonebot import get_driver, get_plugin_config, logger, on_message, require
+from nonebot.adapters import Event
 from nonebot.plugin import PluginMetadata
-from nonebot.rule import to_me
+from nonebot.rule import Rule
+from nonebot.typing import T_State
 from nonebot_plugin_alconna import UniMessage
 
+from .....cache import LRUCache, SingleFlight
+from .....links import PATTERN, find_links
+from .....utils import USER_AGENT, get_client
 from ...utils import bv2av, get_share_placard
 from .config import Config
 
+require("nonebot_plugin_localstore")
+
+import nonebot_plugin_localstore as store
+
 __plugin_meta__ = PluginMetadata(
     name="bilibili.parse",
     description="",
@@ -18,23 +30,91 @@ global_config = get_driver().config
 plugin_config = get_plugin_config(Config)
 
 
+short_cache = LRUCache(
+    plugin_config.short_cache_size,
+    path=store.get_plugin_cache_dir() / "short",
+    disk_maxsize=plugin_config.short_cache_disk_size,
+)
+short_flight = SingleFlight[str]()
+client = get_client("bilibili.parse", headers={"user-agent": USER_AGENT})
+
 TEMPLATE = UniMessage.template("{:Image(url=picture)}{link}")
+RESOLVERS: dict[str, Callable[[str], tuple[int, str]]] = {
+    "aid": lambda aid: (int(aid), "main.ugc-video-detail.0.0.pv"),
+    "bvid": lambda bvid: (bv2av(bvid), "main.ugc-video-detail.0.0.pv"),
+    "uid": lambda uid: (int(uid), "main.space-total.more.0.click"),
+}
+
+
+async def fetch_short(code: str) -> str:
+    resp = await client.head(f"https://b23.tv/{code}", follow_redirects=False)
+    if not resp.is_redirect:
+        raise ValueError(f"Invalid short link: {code}")
+
+    target = resp.headers["location"]
+    short_cache.set(code, target.encode())
+    return target
+
+
+async def expand(code: str) -> str:
+    if (target := short_cache.get(code)) is not None:
+        return target.decode()
+
+    return await short_flight(code, partial(fetch_short, code))
+
+
+async def resolve(group: str, value: str) -> list[tuple[int, str]]:
+    if group != "short":
+        return [RESOLVERS[group](value)]
+
+    return [
+        RESOLVERS[match.lastgroup](match[match.lastgroup])
+        for match in PATTERN.finditer(await expand(value))
+        if match.lastgroup in RESOLVERS
+    ]
+
+
+def match(event: Event, state: T_State) -> bool:
+    if not event.is_tome():
+        return False
 
+    state["matches"] = matches = find_links(str(event.get_message()))
+    return bool(matches)
 
-@on_regex(r"(?:av|AV)(\d{1,16})", rule=to_me()).handle()
-async def parse_aid(aid: str = RegexStr(1)):
-    await TEMPLATE.format_map(
-        await get_share_placard(aid, "main.ugc-video-detail.0.0.pv")
-    ).send()
 
+@on_message(rule=Rule(match), block=False).handle()
+async def _(state: T_State):
+    groups = dict.fromkeys(
+        (match.lastgroup, match[match.lastgroup])
+        for match in state["matches"]
+        if match.lastgroup
+    )
 
-@on_regex(r"BV1[1-9a-km-zA-HJ-NP-Z]{9}", rule=to_me()).handle()
-async def _(bvid: str = RegexStr()):
-    await parse_aid(bv2av(bvid))
+    refs: dict[tuple[int, str], None] = {}
+    for group, result in zip(
+        groups,
+        await gather(
+            *(resolve(group, value) for group, value in groups),
+            return_exceptions=True,
+        ),
+    ):
+        if isinstance(result, BaseException):
+            logger.warning(f"Failed to resolve {group}: {result!r}")
+        else:
+            refs.update(dict.fromkeys(result))
 
+    msg = UniMessage()
+    for ref, placard in zip(
+        refs,
+        await gather(
+            *(get_share_placard(oid, share_id) for oid, share_id in refs),
+            return_exceptions=True,
+        ),
+    ):
+        if isinstance(placard, BaseException):
+            logger.warning(f"Failed to get share placard of {ref}: {placard!r}")
+        else:
+            msg += TEMPLATE.format_map(placard)
 
-@on_regex(r"UID:(\d+)", rule=to_me()).handle()
-async def _(uid: str = RegexStr(1)):
-    await TEMPLATE.format_map(
-        await get_share_placard(uid, "main.space-total.more.0.click")
-    ).send()
+    if msg:
+        await msg.send()
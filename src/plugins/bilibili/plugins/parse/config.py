@@ -1,5 +1,12 @@
-from pydantic import BaseModel, Extra
+from pydantic import BaseConfig, BaseModel, Extra
 
+from src.utils import with_prefix
 
-class Config(BaseModel, extra=Extra.ignore):
-    """Plugin Config Here"""
+
+class Config(BaseModel):
+    short_cache_size: int = 1 << 20
+    short_cache_disk_size: int = 16 << 20
+
+    class Config(BaseConfig):
+        alias_generator = with_prefix("bilibili_parse")
+        extra = Extra.ignore
@@ -1,13 +1,27 @@
 import re
 import string
+from asyncio import Lock, sleep
+from collections.abc import Iterator
+from functools import partial
+from json import dumps, loads
 from random import choices
+from time import monotonic
 from typing import Any, NoReturn, TypedDict
 
 from arclet.alconna import Arg
-from httpx import AsyncClient, Response
+from httpx import Response
 from nepattern import BasePattern, MatchMode
-from nonebot import logger
+from nonebot import get_plugin_config, logger
 from nonebot_plugin_alconna import UniMessage
+from nonebot_plugin_orm import get_session
+from nonebot_plugin_uninfo.orm import SceneModel
+from sqlalchemy import select
+
+from ...cache import LRUCache, SingleFlight
+from ...utils import get_client
+from .config import Config
+
+plugin_config = get_plugin_config(Config)
 
 UID_ARG = Arg(
     "uid",
@@ -36,18 +50,134 @@ def bv2av(bvid: str) -> int:
     return (tmp & 0x7FFFFFFFFFFFF) ^ 0x01552356C4CDB
 
 
+RISK_CONTROL_CODES = {-352, -412, -509, -799}
+
+
+class BilibiliError(Exception):
+    code: int
+    message: str
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class RiskControlError(BilibiliError):
+    pass
+
+
+class ThrottledError(BilibiliError):
+    pass
+
+
 def raise_for_status(resp: Response) -> Any:
     try:
         data = resp.json()
     except Exception:
+        if resp.status_code == 412:
+            raise RiskControlError(-412, resp.reason_phrase)
         resp.raise_for_status()
         raise ValueError(f"Invalid response: {resp.content}")
 
-    assert data["code"] == 0, data
+    if (code := data["code"]) in RISK_CONTROL_CODES:
+        raise RiskControlError(code, data.get("message", ""))
+    if code != 0:
+        raise BilibiliError(code, data.get("message", ""))
     return data.get("data")
 
 
-client = AsyncClient(
+class Limiter:
+    name: str
+    rate: float
+    burst: int
+    tokens: float
+    updated: float
+    backoff: float
+    until: float
+    throttles: int
+    lock: Lock
+
+    def __init__(self, name: str, rate: float, burst: int) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+        self.backoff = 0
+        self.until = 0
+        self.throttles = 0
+        self.lock = Lock()
+
+    def __repr__(self) -> str:
+        return (
+            f"Limiter({self.name}, tokens={self.tokens:.1f}, "
+            f"backoff={self.backoff:.0f}s, remaining={self.remaining:.0f}s, "
+            f"throttles={self.throttles})"
+        )
+
+    @property
+    def remaining(self) -> float:
+        return max(self.until - monotonic(), 0)
+
+    @property
+    def throttled(self) -> bool:
+        return self.remaining > 0
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                if self.throttled:
+                    raise ThrottledError(-412, f"{self} is backing off")
+
+                now = monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self) -> None:
+        self.backoff = min(
+            max(self.backoff * 2, plugin_config.backoff_min), plugin_config.backoff_max
+        )
+        self.until = monotonic() + self.backoff
+        self.tokens = 0
+        self.throttles += 1
+        logger.warning(f"Risk control triggered, backing off: {self}")
+
+    def recover(self) -> None:
+        if self.backoff and not self.throttled:
+            self.backoff /= 2
+            if self.backoff < plugin_config.backoff_min:
+                self.backoff = 0
+            logger.info(f"Recovered from risk control: {self}")
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(
+        self, exc_type: Any, exc: BaseException | None, traceback: Any
+    ) -> None:
+        if isinstance(exc, RiskControlError):
+            self.throttle()
+        elif exc is None:
+            self.recover()
+
+
+limiters = {
+    name: Limiter(name, rate, plugin_config.rate_burst)
+    for name, rate in plugin_config.rate_limits.items()
+}
+
+
+client = get_client(
+    "bilibili.share",
     headers={
         "user-agent": "bili-universal/75600100 CFNetwork/1.0 "
         "Darwin/23.2.0 os/ios model/iPhone 13 mini mobi_app/iphone "
@@ -63,24 +193,59 @@ URL_PATTERN = re.compile(
 )
 
 
+CANONICAL_URLS = {
+    "dt.dt-detail.0.0.pv": "https://t.bilibili.com/{}",
+    "live.live-room-detail.0.0.pv": "https://live.bilibili.com/{}",
+    "main.ugc-video-detail.0.0.pv": "https://www.bilibili.com/video/av{}",
+    "main.space-total.more.0.click": "https://space.bilibili.com/{}",
+}
+
+share_click_cache = LRUCache(
+    plugin_config.share_cache_size, plugin_config.share_cache_ttl
+)
+share_click_flight = SingleFlight[str]()
+
+
+async def fetch_share_click(oid: Any, origin: str, share_id: str) -> str:
+    async with limiters["share"]:
+        data = raise_for_status(
+            await client.post(
+                "/click",
+                data={
+                    "oid": oid,
+                    "share_id": share_id,
+                    "share_origin": origin,
+                    "platform": "ios",
+                    "share_channel": "COPY",
+                    "share_mode": 3,
+                    "build": "75400100",
+                    "buvid": "".join(
+                        choices(string.digits + string.ascii_uppercase, k=36)
+                    ),
+                },
+            )
+        )
+
+    url = next(URL_PATTERN.finditer(data["content"]))[0]
+    share_click_cache.set(f"{oid}:{origin}:{share_id}", url.encode())
+    return url
+
+
 async def get_share_click(oid: Any, origin: str, share_id: str) -> str:
-    data = raise_for_status(
-        await client.post(
-            "/click",
-            data={
-                "oid": oid,
-                "share_id": share_id,
-                "share_origin": origin,
-                "platform": "ios",
-                "share_channel": "COPY",
-                "share_mode": 3,
-                "build": "75400100",
-                "buvid": "".join(choices(string.digits + string.ascii_uppercase, k=36)),
-            },
+    key = f"{oid}:{origin}:{share_id}"
+    if (url := share_click_cache.get(key)) is not None:
+        return url.decode()
+
+    try:
+        return await share_click_flight(
+            key, partial(fetch_share_click, oid, origin, share_id)
         )
-    )
+    except Exception as e:
+        if share_id not in CANONICAL_URLS:
+            raise
 
-    return next(URL_PATTERN.finditer(data["content"]))[0]
+        logger.warning(f"Failed to get share link of {key}: {e!r}")
+        return CANONICAL_URLS[share_id].format(oid)
 
 
 class SharePlacard(TypedDict):
@@ -88,21 +253,108 @@ class SharePlacard(TypedDict):
     link: str
 
 
-async def get_share_placard(oid: Any, share_id: str) -> SharePlacard:
-    return raise_for_status(
-        await client.post(
-            "/placard",
-            data={
-                "oid": oid,
-                "platform": "ios",
-                "share_id": share_id,
-                "buvid": "".join(choices(string.digits + string.ascii_uppercase, k=36)),
-            },
+placard_cache = LRUCache(
+    plugin_config.placard_cache_size, plugin_config.placard_cache_ttl
+)
+placard_flight = SingleFlight[SharePlacard]()
+
+
+async def fetch_share_placard(oid: Any, share_id: str) -> SharePlacard:
+    async with limiters["share"]:
+        placard = raise_for_status(
+            await client.post(
+                "/placard",
+                data={
+                    "oid": oid,
+                    "platform": "ios",
+                    "share_id": share_id,
+                    "buvid": "".join(
+                        choices(string.digits + string.ascii_uppercase, k=36)
+                    ),
+                },
+            )
         )
-    )
+    placard_cache.set(f"{oid}:{share_id}", dumps(placard).encode())
+    return placard
+
+
+async def get_share_placard(oid: Any, share_id: str) -> SharePlacard:
+    key = f"{oid}:{share_id}"
+    if (placard := placard_cache.get(key)) is not None:
+        return loads(placard)
+
+    return await placard_flight(key, partial(fetch_share_placard, oid, share_id))
 
 
 async def handle_error(message: str) -> NoReturn:
     logger.error(message)
     await UniMessage(message).send()
     raise
+
+
+class SubscriptionIndex:
+    model: Any
+    scenes: dict[int, dict[int, SceneModel]]
+    touched: set[tuple[int, int]]
+
+    def __init__(self, model: Any) -> None:
+        self.model = model
+        self.scenes = {}
+        self.touched = set()
+
+    def __getitem__(self, uid: int) -> list[SceneModel]:
+        return list(self.scenes.get(uid, {}).values())
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self.scenes
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.scenes)
+
+    def add(self, uid: int, scene: SceneModel) -> None:
+        self.touched.add((uid, scene.id))
+        self.scenes.setdefault(uid, {})[scene.id] = scene
+
+    def remove(self, uid: int, scene_id: int) -> None:
+        self.touched.add((uid, scene_id))
+        if (scenes := self.scenes.get(uid)) is None:
+            return
+
+        scenes.pop(scene_id, None)
+        if not scenes:
+            del self.scenes[uid]
+
+    async def fetch(self) -> dict[int, dict[int, SceneModel]]:
+        scenes: dict[int, dict[int, SceneModel]] = {}
+
+        async with get_session() as session:
+            for sub in await session.scalars(select(self.model)):
+                scenes.setdefault(sub.uid, {})[sub.scene_id] = sub.scene
+
+        return scenes
+
+    async def load(self) -> None:
+        self.scenes = await self.fetch()
+
+    async def check(self) -> None:
+        self.touched = set()
+        scenes = await self.fetch()
+
+        expected = {(uid, id) for uid, ids in scenes.items() for id in ids}
+        actual = {(uid, id) for uid, ids in self.scenes.items() for id in ids}
+        missing = expected - actual - self.touched
+        stale = actual - expected - self.touched
+        if not missing and not stale:
+            return
+
+        logger.warning(
+            f"{self.model.__name__} index out of sync, "
+            f"missing: {missing}, stale: {stale}"
+        )
+
+        for uid, id in missing:
+            self.scenes.setdefault(uid, {})[id] = scenes[uid][id]
+        for uid, id in stale:
+            del self.scenes[uid][id]
+            if not self.scenes[uid]:
+                del self.scenes[uid]
@@ -0,0 +1,15 @@
+from hashlib import sha256
+from importlib.resources.abc import Traversable
+
+from jinja2 import DictLoader, Environment
+
+
+def load_templates(root: Traversable) -> tuple[Environment, str]:
+    sources = {
+        file.name: file.read_text("utf-8") for file in root.iterdir() if file.is_file()
+    }
+    version = sha256("".join(sources[name] for name in sorted(sources)).encode())
+    return (
+        Environment(loader=DictLoader(sources), enable_async=True),
+        version.hexdigest(),
+    )
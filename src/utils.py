@@ -1,15 +1,31 @@
-from asyncio import Task, create_task
-from collections.abc import Callable
+from asyncio import (
+    Future,
+    PriorityQueue,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    get_running_loop,
+    sleep,
+)
+from collections.abc import Callable, Iterator
 from contextlib import suppress
+from enum import IntEnum
+from functools import partial
 from inspect import iscoroutine
-from typing import TYPE_CHECKING, Awaitable, TypeVar, cast
+from itertools import count
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Awaitable, TypeVar, cast
 
-from httpx import AsyncClient
+from httpx import AsyncClient, AsyncHTTPTransport, HTTPError, Limits, Timeout
+from nonebot import get_driver, get_plugin_config, logger
+from nonebot.adapters import Bot
 from nonebot.exception import ActionFailed
-from nonebot_plugin_alconna import AtAll, SupportAdapter, UniMessage
+from nonebot_plugin_alconna import AtAll, SupportAdapter, Target, UniMessage
 from nonebot_plugin_alconna.uniseg import Receipt
-from nonebot_plugin_uninfo.orm import SceneModel, get_bot_model
+from nonebot_plugin_uninfo.orm import BotModel, SceneModel, get_bot_model
 from nonebot_plugin_uninfo.target import to_target
+from pydantic import BaseConfig, BaseModel, Extra
 
 if TYPE_CHECKING:
     from nonebot.adapters.milky.model.api import MessageResponse
@@ -18,6 +34,7 @@ if TYPE_CHECKING:
 T = TypeVar("T")
 
 
+driver = get_driver()
 tasks: set[Task] = set()
 
 
@@ -39,10 +56,125 @@ def run_task(awaitable: Awaitable[T]) -> Task[T]:
     return task
 
 
-async def send_message(scene_model: SceneModel, msg: UniMessage) -> Receipt:
-    bot_model = await get_bot_model(scene_model.bot_persist_id)
+class TargetCache:
+    data: dict[int, tuple[BotModel, Target]]
+    hits: int
+    misses: int
+
+    def __init__(self) -> None:
+        self.data = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"TargetCache(size={len(self.data)}, hits={self.hits}, misses={self.misses})"
+
+    async def get(self, scene_model: SceneModel) -> tuple[BotModel, Target]:
+        if (item := self.data.get(scene_model.id)) is not None:
+            self.hits += 1
+            return item
+
+        self.misses += 1
+        bot_model = await get_bot_model(scene_model.bot_persist_id)
+        target = to_target(
+            await scene_model.to_scene(), bot_model.scope, without_self=True
+        )
+        self.data[scene_model.id] = bot_model, target
+        return bot_model, target
+
+    def invalidate(self, bot: Bot) -> None:
+        for id, (bot_model, _) in list(self.data.items()):
+            if (
+                bot_model.self_id == bot.self_id
+                and bot_model.adapter == bot.adapter.get_name()
+            ):
+                del self.data[id]
+
+        logger.debug(f"Invalidated targets of bot {bot.self_id}: {self}")
+
+
+targets = TargetCache()
+
+
+@driver.on_bot_connect
+@driver.on_bot_disconnect
+async def _(bot: Bot) -> None:
+    targets.invalidate(bot)
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+
 
-    target = to_target(await scene_model.to_scene(), bot_model.scope, without_self=True)
+class SendScheduler:
+    name: str
+    interval: float
+    queue: PriorityQueue[
+        tuple[int, int, float, Callable[[], Awaitable[Any]], Future[Any]]
+    ]
+    workers: list[Task]
+    next: float
+    counter: Iterator[int]
+    sent: int
+    latency: float
+    max_latency: float
+
+    def __init__(self, name: str, rate: float, concurrency: int) -> None:
+        self.name = name
+        self.interval = 1 / rate
+        self.queue = PriorityQueue()
+        self.workers = [create_task(self.work()) for _ in range(concurrency)]
+        self.next = 0
+        self.counter = count()
+        self.sent = 0
+        self.latency = 0
+        self.max_latency = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"SendScheduler({self.name}, queued={self.queue.qsize()}, "
+            f"sent={self.sent}, avg_latency={self.latency / (self.sent or 1):.3f}s, "
+            f"max_latency={self.max_latency:.3f}s)"
+        )
+
+    async def __call__(self, priority: int, func: Callable[[], Awaitable[T]]) -> T:
+        future = get_running_loop().create_future()
+        self.queue.put_nowait((priority, next(self.counter), monotonic(), func, future))
+        return await future
+
+    async def work(self) -> None:
+        while True:
+            _, _, enqueued, func, future = await self.queue.get()
+            if future.done():
+                continue
+
+            slot = max(self.next, monotonic())
+            self.next = slot + self.interval
+            await sleep(slot - monotonic())
+
+            latency = monotonic() - enqueued
+            self.sent += 1
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            logger.debug(f"Sending message after {latency:.3f}s in queue: {self}")
+
+            try:
+                result = await func()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+send_schedulers: dict[int, SendScheduler] = {}
+
+
+async def _send_message(
+    bot_model: BotModel, target: Target, msg: UniMessage
+) -> Receipt:
     bot = bot_model.get_bot()
 
     with suppress(ActionFailed):
@@ -57,13 +189,136 @@ async def send_message(scene_model: SceneModel, msg: UniMessage) -> Receipt:
     return await msg.exclude(AtAll).send(target, bot)
 
 
+async def send_message(
+    scene_model: SceneModel, msg: UniMessage, priority: int = Priority.NORMAL
+) -> Receipt:
+    bot_model, target = await targets.get(scene_model)
+
+    if (send_scheduler := send_schedulers.get(bot_model.id)) is None:
+        send_scheduler = send_schedulers[bot_model.id] = SendScheduler(
+            f"bot {bot_model.self_id}", send_config.rate, send_config.concurrency
+        )
+
+    return await send_scheduler(
+        priority, partial(_send_message, bot_model, target, msg)
+    )
+
+
+class Stage:
+    name: str
+    semaphore: Semaphore
+    pending: int
+    running: int
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.semaphore = Semaphore(limit)
+        self.pending = 0
+        self.running = 0
+
+    def __repr__(self) -> str:
+        return f"{self.name}(pending={self.pending}, running={self.running})"
+
+    async def __call__(self, awaitable: Awaitable[T]) -> T:
+        self.pending += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.pending -= 1
+
+        self.running += 1
+        try:
+            return await awaitable
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+
 def with_prefix(prefix: str) -> Callable[[str], str]:
     return lambda name: f"{prefix}_{name}"
 
 
-client = AsyncClient(
-    headers={
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+class SendConfig(BaseModel):
+    rate: float = 5
+    concurrency: int = 2
+
+    class Config(BaseConfig):
+        alias_generator = with_prefix("send")
+        extra = Extra.ignore
+
+
+class HTTPConfig(BaseModel):
+    http2: bool = True
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 120
+    connect_timeout: float = 5
+    read_timeout: float = 15
+    host_limits: dict[str, int] = {
+        "api.bilibili.com": 16,
+        "api.live.bilibili.com": 8,
+        "b23.tv": 4,
     }
+
+    class Config(BaseConfig):
+        alias_generator = with_prefix("http")
+        extra = Extra.ignore
+
+
+send_config = get_plugin_config(SendConfig)
+http_config = get_plugin_config(HTTPConfig)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
 )
+
+
+def create_transport(max_connections: int) -> AsyncHTTPTransport:
+    return AsyncHTTPTransport(
+        http2=http_config.http2,
+        limits=Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(
+                max_connections, http_config.max_keepalive_connections
+            ),
+            keepalive_expiry=http_config.keepalive_expiry,
+        ),
+    )
+
+
+transport = create_transport(http_config.max_connections)
+mounts = {
+    f"all://{host}": create_transport(limit)
+    for host, limit in http_config.host_limits.items()
+}
+timeout = Timeout(http_config.read_timeout, connect=http_config.connect_timeout)
+clients: dict[str, AsyncClient] = {}
+
+
+def get_client(name: str, **kwargs: Any) -> AsyncClient:
+    if (client := clients.get(name)) is None:
+        client = clients[name] = AsyncClient(
+            transport=transport, mounts=mounts, timeout=timeout, **kwargs
+        )
+    return client
+
+
+client = get_client("default", headers={"user-agent": USER_AGENT})
+
+
+async def warmup(host: str) -> None:
+    try:
+        await client.head(f"https://{host}/")
+    except HTTPError as e:
+        logger.debug(f"Failed to warm up connection to {host}: {e!r}")
+
+
+@driver.on_startup
+async def _() -> None:
+    run_task(gather(*map(warmup, http_config.host_limits)))
+
+
+@driver.on_shutdown
+async def _() -> None:
+    await gather(transport.aclose(), *(t.aclose() for t in mounts.values()))